@@ -1,35 +1,87 @@
 # 1. SQLAlchemy에서 필요한 함수들을 가져옵니다.
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+import settings
 
 # 2. 데이터베이스 연결 주소를 정의합니다.
-# 여기서는 프로젝트 폴더에 'WordSearch.db'라는 이름의 SQLite 데이터베이스 파일을 사용하겠다는 의미입니다.
-DATABASE_URL = "sqlite:///./WordSearch.db"
+# 기본값은 프로젝트 폴더의 'WordSearch.db' SQLite 파일이며,
+# settings.py(환경 변수)를 통해 다른 데이터베이스 서버로 바꿀 수 있습니다.
+DATABASE_URL = settings.DATABASE_URL
+READ_DATABASE_URL = settings.READ_DATABASE_URL
 
-# 3. 데이터베이스 엔진을 생성합니다.
+# 3. SQLite 연결이 새로 만들어질 때마다 PRAGMA를 설정하는 함수입니다.
+# WAL 모드에서는 읽기가 쓰기를 막지 않고, 쓰기도 읽기를 막지 않으므로
+# 쓰기가 몰리는 동안에도 조회 요청이 잠금 때문에 멈추지 않습니다.
+def _apply_sqlite_pragmas(dbapi_connection, read_only: bool):
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        # journal_mode는 DB 파일에 저장되므로 쓰기 연결에서 한 번 설정하면 유지됩니다.
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    if read_only:
+        # 읽기 풀의 연결로는 실수로라도 데이터를 변경할 수 없도록 막습니다.
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+# 4. 데이터베이스 엔진을 생성하는 함수입니다.
 # 엔진은 SQLAlchemy가 데이터베이스와 통신하는 시작점입니다.
-engine = create_engine(
-    DATABASE_URL, 
+def _create_engine(url: str, read_only: bool):
+    if read_only:
+        pool_options = {"pool_size": settings.DB_READ_POOL_SIZE, "max_overflow": settings.DB_READ_MAX_OVERFLOW}
+    else:
+        pool_options = {"pool_size": settings.DB_WRITE_POOL_SIZE, "max_overflow": settings.DB_WRITE_MAX_OVERFLOW}
+
+    if not url.startswith("sqlite"):
+        connect_args = {}
+        if read_only and url.startswith("postgresql"):
+            # PostgreSQL은 세션 기본값으로 읽기 전용 트랜잭션을 강제합니다.
+            # 🚨 그 외 서버 DB(MySQL 등)는 읽기 전용이 강제되지 않으므로, 읽기 전용 계정을 READ_DATABASE_URL에 지정하세요.
+            connect_args["options"] = "-c default_transaction_read_only=on"
+        return create_engine(url, connect_args=connect_args, pool_timeout=settings.DB_POOL_TIMEOUT, pool_pre_ping=True, **pool_options)
+
     # SQLite는 기본적으로 한 번에 하나의 스레드만 접근을 허용합니다.
     # FastAPI는 비동기적으로 여러 스레드를 사용할 수 있으므로, 이 제한을 해제하는 옵션입니다.
-    connect_args={"check_same_thread": False}
-)
+    # 위의 풀 크기 설정이 SQLAlchemy 버전과 관계없이 적용되도록 QueuePool을 명시적으로 지정합니다.
+    sqlite_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        **pool_options
+    )
+
+    @event.listens_for(sqlite_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        _apply_sqlite_pragmas(dbapi_connection, read_only)
+
+    return sqlite_engine
+
+# 쓰기용 엔진 (테이블 생성 등 기본 엔진으로도 사용합니다)
+engine = _create_engine(DATABASE_URL, read_only=False)
+# 읽기 전용 엔진
+read_engine = _create_engine(READ_DATABASE_URL, read_only=True)
 
-# 4. 데이터베이스 세션(Session)을 생성하는 클래스를 만듭니다.
+# 5. 데이터베이스 세션(Session)을 생성하는 클래스를 만듭니다.
 # sessionmaker는 '세션 공장'과 같습니다. 이 공장을 통해 필요할 때마다 세션을 찍어낼 수 있습니다.
 # autocommit=False: 데이터를 변경해도 자동으로 DB에 반영(commit)하지 않습니다.
 # autoflush=False: 세션에 변경사항이 생겨도 자동으로 DB에 임시 저장(flush)하지 않습니다.
 # bind=engine: 이 세션 공장이 위에서 만든 엔진을 사용하도록 연결합니다.
 SeesionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) # 🚨 오타 제안: SeesionLocal -> SessionLocal
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
-# 5. 선언적 모델링을 위한 기본 클래스(Base)를 생성합니다.
+# 6. 선언적 모델링을 위한 기본 클래스(Base)를 생성합니다.
 # models.py 파일의 모든 모델 클래스(User, Game 등)는 이 Base 클래스를 상속받아야 합니다.
 # 이를 통해 SQLAlchemy가 파이썬 클래스와 데이터베이스 테이블을 매핑할 수 있습니다.
 Base = declarative_base()
 
-# 6. FastAPI 의존성 주입(Dependency Injection)을 위한 함수입니다.
+# 7. FastAPI 의존성 주입(Dependency Injection)을 위한 함수입니다.
 # 이 함수는 API 엔드포인트가 호출될 때마다 실행되어 데이터베이스 세션을 제공하고,
 # 요청 처리가 끝나면 세션을 안전하게 닫는 역할을 합니다.
+# 데이터를 변경하는(POST, DELETE 등) 엔드포인트에서 사용합니다.
 def get_db():
     # 위에서 만든 '세션 공장'을 호출하여 새로운 데이터베이스 세션을 생성합니다.
     db = SeesionLocal()
@@ -42,3 +94,12 @@ def get_db():
         # finally 블록은 항상 실행되어 데이터베이스 세션을 닫아줍니다.
         # 이는 리소스 낭비를 막는 매우 중요한 패턴입니다.
         db.close()
+
+# 조회만 하는(GET) 엔드포인트에서 사용하는 읽기 전용 세션입니다.
+# 쓰기 연결을 차지하지 않으므로 쓰기 작업과 동시에 처리될 수 있습니다.
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,12 +1,14 @@
 # --- 1. 라이브러리 및 모듈 가져오기 ---
 from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, BackgroundTasks
 from fastapi.security import HTTPBearer
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 # 직접 만든 유틸리티 및 모듈들
 from auth_utils import hash_password, verify_password, create_access_token, verify_token
 from schemas import UserCreate, UserLogin, UserResponse, Token, GameResponse, GameCreate, ResultResponse, ResultCreate, CommentCreate, CommentResponse
 from models import User, Game, Base
-from database import engine, get_db
+from database import engine, get_db, get_read_db, ReadSessionLocal
+from rate_limit import rate_limit, generation_slot, acquire_ws_slots, release_ws_slots
 from crud import (
     create_game as create_game_crud,
     get_games as get_games_crud,
@@ -36,7 +38,8 @@ oauth2_scheme = HTTPBearer()
 # 요청 헤더의 토큰을 검증하고, 유효하면 해당 사용자 정보를 DB에서 가져오는 함수입니다.
 # 이 함수는 다른 엔드포인트에서 '의존성(Dependency)'으로 주입되어,
 # 인증이 필요한 API를 보호하는 역할을 합니다.
-def get_current_user(credentials: HTTPBearer = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# 사용자 조회는 읽기 작업이므로 읽기 전용 세션을 사용해, 쓰기 연결을 불필요하게 오래 붙잡지 않습니다.
+def get_current_user(credentials: HTTPBearer = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
     token = credentials.credentials
     payload = verify_token(token)
     if payload is None:
@@ -52,20 +55,24 @@ def get_current_user(credentials: HTTPBearer = Depends(oauth2_scheme), db: Sessi
     return user
 
 # --- 4. API 엔드포인트 (라우트) 정의 ---
+# 조회만 하는 엔드포인트는 get_read_db로 읽기 전용 풀을, 데이터를 변경하는 엔드포인트는 get_db로 쓰기 연결을 사용합니다.
 
 # [인증] 회원가입
+# 이메일 중복 확인은 읽기 세션으로 하고, 시간이 오래 걸리는 bcrypt 해싱도 쓰기 연결을 잡기 전에 끝내
+# 회원가입 때문에 다른 쓰기 요청이 기다리지 않도록 합니다.
 @app.post("/auth/signup", response_model=UserResponse)
-def signup(user_data: UserCreate, db: Session = Depends(get_db)):
+def signup(user_data: UserCreate, read_db: Session = Depends(get_read_db), db: Session = Depends(get_db)):
     # 이미 존재하는 이메일인지 확인합니다.
-    existing = db.query(User).filter(User.email == user_data.email).first()
+    existing = read_db.query(User).filter(User.email == user_data.email).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # 새 사용자 객체를 생성하고 비밀번호를 해싱하여 저장합니다.
+    password_hash = hash_password(user_data.password)
     user = User(
         username=user_data.username,
         email=user_data.email,
-        password_hash=hash_password(user_data.password)
+        password_hash=password_hash
     )
     db.add(user)
     db.commit()
@@ -73,8 +80,9 @@ def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     return user
 
 # [인증] 로그인
+# 로그인은 조회만 하므로 읽기 세션을 사용합니다. (bcrypt 검증 동안 쓰기 연결을 잡고 있지 않도록)
 @app.post("/auth/login", response_model=Token)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
+def login(user_data: UserLogin, db: Session = Depends(get_read_db)):
     user = db.query(User).filter(User.email == user_data.email).first()
     # 사용자가 존재하지 않거나 비밀번호가 틀리면 에러를 발생시킵니다.
     if not user or not verify_password(user_data.password, user.password_hash):
@@ -91,19 +99,20 @@ def me(current_user: User = Depends(get_current_user)):
     return current_user
 
 # [게임] 게임 생성 (인증 필요)
-@app.post("/games", response_model=GameResponse)
+# 그리드 생성은 CPU를 많이 쓰므로 클라이언트별 요청 빈도와 전체 동시 실행 개수를 함께 제한합니다.
+@app.post("/games", response_model=GameResponse, dependencies=[Depends(rate_limit("create_game", ip_route="create_game_ip")), Depends(generation_slot)])
 def create_game(game_data: GameCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     # crud.py의 함수를 호출하여 게임 생성 로직을 수행합니다.
     return create_game_crud(db, game_data, created_by=current_user.id)
 
 # [게임] 게임 목록 조회
 @app.get("/games", response_model=list[GameResponse])
-def list_games(db: Session = Depends(get_db)):
+def list_games(db: Session = Depends(get_read_db)):
     return get_games_crud(db)
 
 # [게임] 게임 상세 조회
 @app.get("/games/{game_id}", response_model=GameResponse)
-def read_game(game_id: int, db: Session = Depends(get_db)):
+def read_game(game_id: int, db: Session = Depends(get_read_db)):
     game = game_detail(db, game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
@@ -124,8 +133,10 @@ def delete_game_endpoint(game_id:int, db:Session = Depends(get_db), current_user
     return {"message": "Game deleted successfully"}
 
 # [결과] 게임 결과 저장 및 브로드캐스트
-@app.post("/games/{game_id}/results", response_model=ResultResponse)
-async def create_result_save(game_id: int, result_data: ResultCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+# 저장할 때마다 커밋과 브로드캐스트가 일어나므로 게임별, 클라이언트별 요청 빈도를 제한합니다.
+# 쓰기 연결을 기다리는 동안 이벤트 루프가 멈추지 않도록 async가 아닌 일반 함수로 정의해 스레드풀에서 실행합니다.
+@app.post("/games/{game_id}/results", response_model=ResultResponse, dependencies=[Depends(rate_limit("create_result", scope_param="game_id"))])
+def create_result_save(game_id: int, result_data: ResultCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     game = db.query(Game).filter(Game.id == game_id).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
@@ -147,7 +158,7 @@ async def create_result_save(game_id: int, result_data: ResultCreate, background
 
 # [결과] 게임 결과 목록 조회
 @app.get("/games/{game_id}/results", response_model=list[ResultResponse])
-def results_list(game_id: int, db: Session = Depends(get_db)):
+def results_list(game_id: int, db: Session = Depends(get_read_db)):
     game = db.query(Game).filter(Game.id == game_id).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
@@ -159,23 +170,52 @@ def results_list(game_id: int, db: Session = Depends(get_db)):
 # 각 게임 ID별로 연결된 WebSocket 클라이언트 목록을 저장하는 딕셔너리입니다.
 game_connections: dict[int, list[WebSocket]] = {}
 
+# 게임이 존재하는지 읽기 세션으로 가볍게 확인합니다.
+def game_exists(game_id: int) -> bool:
+    db = ReadSessionLocal()
+    try:
+        return db.query(Game.id).filter(Game.id == game_id).first() is not None
+    finally:
+        db.close()
+
 # WebSocket 연결을 처리하는 엔드포인트입니다.
+# DB 조회와 제한 스토어 호출은 블로킹될 수 있으므로 run_in_threadpool로 실행해 이벤트 루프를 막지 않습니다.
 @app.websocket("/ws/games/{game_id}/results")
 async def websocket_game_results(websocket: WebSocket, game_id: int):
-    await websocket.accept()
-    
-    # 해당 게임의 연결 목록에 현재 클라이언트를 추가합니다.
-    if game_id not in game_connections:
-        game_connections[game_id] = []
-    game_connections[game_id].append(websocket)
-    
+    # 존재하지 않는 게임이면 슬롯을 잡기 전에 거절합니다. (accept 전에 닫으므로 HTTP 403으로 응답됩니다)
+    if not await run_in_threadpool(game_exists, game_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # 게임별, 클라이언트별 연결 수 제한을 넘으면 바로 닫습니다.
+    # accept 전에 닫으면 HTTP 403으로 거절되어 클라이언트가 종료 코드를 받지 못하므로,
+    # 먼저 수락한 뒤 1013(Try Again Later)으로 닫아 재시도 신호를 보냅니다.
+    slots = await run_in_threadpool(acquire_ws_slots, websocket, game_id)
+    if slots is None:
+        await websocket.accept()
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
     try:
+        await websocket.accept()
+
+        # 해당 게임의 연결 목록에 현재 클라이언트를 추가합니다.
+        if game_id not in game_connections:
+            game_connections[game_id] = []
+        game_connections[game_id].append(websocket)
+
         # 클라이언트 연결이 끊어질 때까지 계속 대기합니다.
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        # 연결이 끊어지면 목록에서 제거합니다.
-        game_connections[game_id].remove(websocket)
+        pass
+    finally:
+        # 연결이 끊어지면 목록에서 제거하고 확보했던 슬롯을 반납합니다.
+        if websocket in game_connections.get(game_id, []):
+            game_connections[game_id].remove(websocket)
+            if not game_connections[game_id]:
+                del game_connections[game_id]
+        await run_in_threadpool(release_ws_slots, slots)
         
 # 특정 게임에 연결된 모든 클라이언트에게 메시지를 보내는 브로드캐스트 함수입니다.
 async def broadcast_result(game_id: int, result_data: dict):
@@ -195,7 +235,7 @@ def create_comment(game_id: int, comment_data: CommentCreate, db: Session = Depe
 
 # [댓글] 댓글 조회
 @app.get("/games/{game_id}/comments", response_model=list[CommentResponse])
-def list_comments(game_id: int, db: Session = Depends(get_db)):
+def list_comments(game_id: int, db: Session = Depends(get_read_db)):
     # ... (생략) ...
     return get_comments_by_game(db, game_id)
 
@@ -223,4 +263,6 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 요청 제한(429) 응답의 Retry-After를 프론트엔드에서 읽을 수 있도록 노출합니다.
+    expose_headers=["Retry-After"],
 )
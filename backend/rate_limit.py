@@ -0,0 +1,211 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+from fastapi import HTTPException, Request, status
+from auth_utils import verify_token
+
+# --- 설정 변수 ---
+# 라우트별 토큰 버킷 설정입니다. (초당 충전되는 토큰 수, 버킷 최대 크기)
+# 버킷 크기만큼은 순간적으로 몰아서 요청할 수 있고, 그 이후로는 충전 속도만큼만 허용됩니다.
+ROUTE_LIMITS = {
+    "create_game": (1 / 10, 3),     # 게임 생성 (사용자별): 10초에 1개, 최대 3개 연속
+    "create_game_ip": (1 / 5, 6),   # 게임 생성 (IP별): 계정을 여러 개 만들어 한도를 늘리는 것을 막습니다.
+    "create_result": (1, 30),       # 결과 저장 (게임+IP별): 초당 1개, 한 반이 동시에 끝내도 되도록 최대 30개 연속
+}
+MAX_CONCURRENT_GENERATIONS = 4      # 동시에 실행할 수 있는 그리드 생성 작업 수 (전체 기준)
+GENERATION_RETRY_AFTER = 1          # 그리드 생성 슬롯이 꽉 찼을 때 안내할 재시도 시간 (초)
+MAX_WS_PER_GAME = 200               # 게임 하나에 붙을 수 있는 최대 WebSocket 수
+MAX_WS_PER_CLIENT = 60              # 클라이언트 하나가 모든 게임을 통틀어 열 수 있는 최대 WebSocket 수
+MAX_WS_PER_CLIENT_PER_GAME = 20     # 클라이언트 하나가 게임 하나에 열 수 있는 최대 WebSocket 수
+BUCKET_SWEEP_INTERVAL = 60          # 가득 찬(다시 쓸 일 없는) 버킷을 정리하는 주기 (초)
+
+# 🚨 참고: 브라우저는 WebSocket 연결에 Authorization 헤더를 붙일 수 없고,
+# 결과 저장(POST /games/{id}/results)도 토큰 없이 호출되므로 이 두 제한은 사실상 IP 기준입니다.
+# 같은 공유기(NAT) 뒤의 여러 사용자(교실, 사무실 등)가 한도를 함께 쓰게 되므로 값을 너무 낮게 잡지 마세요.
+
+# --- 저장소(Store) 정의 ---
+# 제한 상태를 어디에 보관할지 추상화한 기본 클래스입니다.
+# 여러 워커 프로세스가 같은 제한을 공유해야 한다면 Redis 같은 외부 저장소로
+# 이 클래스를 구현해 set_store()로 교체하면 됩니다.
+# 메서드는 동기 함수이며 네트워크 I/O처럼 블로킹될 수 있다고 가정합니다.
+# 그래서 async 코드(WebSocket 엔드포인트 등)에서는 반드시 run_in_threadpool을 통해 호출합니다.
+class RateLimitStore(ABC):
+    @abstractmethod
+    def take_tokens(self, buckets: list[tuple[str, float, int]]) -> float:
+        """
+        (key, 충전 속도, 최대 크기) 목록의 모든 버킷에서 토큰을 하나씩 꺼냅니다.
+        모든 버킷에 토큰이 있을 때만 한꺼번에 꺼내고 0을 반환하며,
+        하나라도 부족하면 아무 버킷도 차감하지 않고 기다려야 할 시간(초)을 반환합니다.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def acquire_slot(self, key: str, limit: int) -> bool:
+        """
+        key의 동시 사용 개수가 limit 미만이면 하나 늘리고 True를 반환합니다.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_slot(self, key: str) -> None:
+        """
+        acquire_slot으로 얻은 슬롯 하나를 반납합니다.
+        """
+        raise NotImplementedError
+
+# 단일 프로세스 안에서 동작하는 기본 저장소입니다.
+# 동기 엔드포인트는 스레드풀에서 실행되므로 Lock으로 상태를 보호합니다.
+class InMemoryRateLimitStore(RateLimitStore):
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (남은 토큰 수, 마지막 갱신 시각, 충전 속도, 최대 크기)
+        self._buckets: dict[str, tuple[float, float, float, int]] = {}
+        self._slots: dict[str, int] = {}
+        self._last_sweep = time.monotonic()
+
+    def take_tokens(self, buckets: list[tuple[str, float, int]]) -> float:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            refilled = {}
+            retry_after = 0
+            for key, rate, capacity in buckets:
+                tokens, updated, _, _ = self._buckets.get(key, (capacity, now, rate, capacity))
+                # 마지막 갱신 이후 흐른 시간만큼 토큰을 충전합니다.
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                refilled[key] = (tokens, rate, capacity)
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) / rate)
+            # 하나라도 부족하면 충전 상태만 기록하고, 토큰은 차감하지 않습니다.
+            spent = 0 if retry_after > 0 else 1
+            for key, (tokens, rate, capacity) in refilled.items():
+                self._buckets[key] = (tokens - spent, now, rate, capacity)
+            return retry_after
+
+    # 이미 가득 찬 버킷은 새 버킷과 구별되지 않으므로 지워도 됩니다.
+    # 접속 IP마다 키가 생기기 때문에, 주기적으로 정리하지 않으면 딕셔너리가 끝없이 커집니다.
+    # 호출하는 쪽에서 Lock을 잡고 있어야 합니다.
+    def _sweep(self, now: float):
+        if now - self._last_sweep < BUCKET_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[2] < bucket[3]
+        }
+
+    def acquire_slot(self, key: str, limit: int) -> bool:
+        with self._lock:
+            count = self._slots.get(key, 0)
+            if count >= limit:
+                return False
+            self._slots[key] = count + 1
+            return True
+
+    def release_slot(self, key: str) -> None:
+        with self._lock:
+            count = self._slots.get(key, 0) - 1
+            # 0이 된 키는 지워서 딕셔너리가 계속 커지지 않도록 합니다.
+            if count > 0:
+                self._slots[key] = count
+            else:
+                self._slots.pop(key, None)
+
+_store: RateLimitStore = InMemoryRateLimitStore()
+
+def set_store(store: RateLimitStore):
+    global _store
+    _store = store
+
+def get_store() -> RateLimitStore:
+    return _store
+
+# --- 클라이언트 식별 ---
+
+# 접속 IP로 클라이언트를 구분합니다.
+# Request와 WebSocket 모두 headers / client 속성을 가지고 있어 그대로 사용할 수 있습니다.
+def ip_key(conn) -> str:
+    host = conn.client.host if conn.client else "unknown"
+    return f"ip:{host}"
+
+# 유효한 토큰이 있으면 사용자 ID로, 없으면 접속 IP로 클라이언트를 구분합니다.
+def client_key(conn) -> str:
+    auth = conn.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        payload = verify_token(auth[7:])
+        if payload and payload.get("sub"):
+            return f"user:{payload['sub']}"
+    return ip_key(conn)
+
+def _too_many_requests(retry_after: float, detail: str):
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+# --- 의존성(Dependency) ---
+
+# 라우트 이름을 받아 토큰 버킷 검사를 수행하는 의존성 함수를 만들어 줍니다.
+# ip_route를 주면 같은 요청을 접속 IP 기준 버킷으로도 함께 제한합니다. (두 버킷 모두 통과해야 차감)
+# scope_param을 주면 해당 경로 파라미터(예: game_id)별로 버킷을 따로 둡니다.
+# 사용 예: @app.post(..., dependencies=[Depends(rate_limit("create_game"))])
+def rate_limit(route: str, ip_route: Optional[str] = None, scope_param: Optional[str] = None):
+    rate, capacity = ROUTE_LIMITS[route]
+
+    def dependency(request: Request):
+        scope = f":{request.path_params[scope_param]}" if scope_param else ""
+        buckets = [(f"{route}{scope}:{client_key(request)}", rate, capacity)]
+        if ip_route:
+            ip_rate, ip_capacity = ROUTE_LIMITS[ip_route]
+            buckets.append((f"{ip_route}{scope}:{ip_key(request)}", ip_rate, ip_capacity))
+        retry_after = get_store().take_tokens(buckets)
+        if retry_after > 0:
+            raise _too_many_requests(retry_after, "Too many requests")
+    return dependency
+
+# CPU를 많이 쓰는 그리드 생성 작업의 동시 실행 개수를 제한합니다.
+# 슬롯이 없으면 기다리지 않고 바로 503을 반환해, 다른 요청의 지연 시간이 늘어나지 않도록 합니다.
+def generation_slot():
+    store = get_store()
+    if not store.acquire_slot("generation", MAX_CONCURRENT_GENERATIONS):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy generating games",
+            headers={"Retry-After": str(GENERATION_RETRY_AFTER)}
+        )
+    try:
+        yield
+    finally:
+        store.release_slot("generation")
+
+# --- WebSocket 연결 수 제한 ---
+
+# 게임별 전체 연결 수, 클라이언트별 전체 연결 수, 게임 안에서 클라이언트별 연결 수를 모두 확인하고 슬롯을 확보합니다.
+# 게임 단위 제한 덕분에 같은 IP의 여러 사용자가 한 게임을 독점하지 못하고,
+# 전체 제한 덕분에 한 클라이언트가 여러 게임에 걸쳐 연결을 끝없이 늘리지도 못합니다.
+# 스토어를 직접 호출하므로 async 코드에서는 run_in_threadpool로 실행해야 합니다.
+# 성공하면 나중에 release_ws_slots()에 넘길 키 목록을, 실패하면 None을 반환합니다.
+def acquire_ws_slots(websocket, game_id: int):
+    store = get_store()
+    client = client_key(websocket)
+    limits = [
+        (f"ws:game:{game_id}", MAX_WS_PER_GAME),
+        (f"ws:{client}", MAX_WS_PER_CLIENT),
+        (f"ws:game:{game_id}:{client}", MAX_WS_PER_CLIENT_PER_GAME),
+    ]
+    acquired = []
+    for key, limit in limits:
+        if not store.acquire_slot(key, limit):
+            # 하나라도 실패하면 앞에서 확보한 슬롯을 모두 되돌립니다.
+            release_ws_slots(acquired)
+            return None
+        acquired.append(key)
+    return acquired
+
+def release_ws_slots(keys: list[str]):
+    store = get_store()
+    for key in keys:
+        store.release_slot(key)